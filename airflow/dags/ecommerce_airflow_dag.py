@@ -4,17 +4,36 @@ from datetime import datetime, timedelta
 from airflow import DAG
 from airflow.operators.python_operator import PythonOperator
 from airflow.operators.dummy_operator import DummyOperator
+from airflow.exceptions import AirflowSkipException
+from airflow.models import Variable
+from airflow.utils.trigger_rule import TriggerRule
 from airflow.utils.dates import days_ago
-import pandas as pd
 import requests
+import gzip
+import json
 import os
+import re
+import shutil
+import time
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from pathlib import Path
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Load environment variables
 load_dotenv()
 
+# Shared HTTP session so the extract calls reuse pooled keep-alive connections,
+# retrying transient gateway errors with backoff
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+
 # DAG Configuration
 DEFAULT_ARGS = {
     'owner': 'data-team',
@@ -26,6 +45,45 @@ DEFAULT_ARGS = {
     'retry_delay': timedelta(minutes=5),
 }
 
+# FakeStore API endpoints, each processed in its own extract >> transform >> upload branch
+ENTITIES = ['products', 'users', 'carts']
+
+# Airflow Variable holding each endpoint's last loaded ETag/Last-Modified
+HTTP_CACHE_VARIABLE = 'fakestore_http_cache_{entity}'
+
+# Airflow pool capping concurrent HTTP/S3 traffic (create with 3 slots)
+NETWORK_IO_POOL = 'network_io'
+
+# Working directories, anchored at AIRFLOW_HOME rather than the task's working directory
+BASE_DIR = Path(os.environ.get("AIRFLOW_HOME", "~/airflow")).expanduser()
+EXTRACT_DIR = BASE_DIR / "extract" / "data"
+CLEANED_DIR = BASE_DIR / "transform" / "cleaned"
+EXTRACT_DIR.mkdir(parents=True, exist_ok=True)
+CLEANED_DIR.mkdir(parents=True, exist_ok=True)
+
+# Snowflake target columns per entity, in cleaned CSV order (see sql/ddl/create_tables.sql)
+SNOWFLAKE_COLUMNS = {
+    'products': 'id, title, price, description, category, image, rating_rate, rating_count',
+    'users': (
+        'id, email, username, password, phone, __v, '
+        'address_geolocation_lat, address_geolocation_long, '
+        'address_city, address_street, address_number, address_zipcode, '
+        'name_firstname, name_lastname'
+    ),
+    'carts': 'id, userid, date, products, __v',
+}
+
+# Characters stripped from column names during standardization
+_CLEAN = re.compile(r"[^\w]")
+
+# Multipart settings for large cleaned files: 16 MiB parts uploaded in parallel
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True
+)
+
 # Initialize DAG
 dag = DAG(
     'ecommerce_etl_pipeline',
@@ -36,163 +94,210 @@ dag = DAG(
     tags=['etl', 'ecommerce', 'functions']
 )
 
-# fetch_products.py function
-def extract_products(**context):
-    """Extract products data from FakeStore API"""
-    # Create the extract/data directory to match your structure
-    extract_dir = Path("extract/data")
-    extract_dir.mkdir(parents=True, exist_ok=True)
+# fetch_products.py / fetch_users.py / fetch_carts.py function
+def extract_entity(entity, **context):
+    """Extract one entity (products, users or carts) from FakeStore API"""
+    raw_file = EXTRACT_DIR / f"{entity}.json"
     
-    response = requests.get("https://fakestoreapi.com/products")
-    products = response.json()
+    # conditional GET against the validators of the last payload loaded into Snowflake
+    cache = Variable.get(HTTP_CACHE_VARIABLE.format(entity=entity), default_var={}, deserialize_json=True)
+    headers = {}
+    if cache.get("etag"):
+        headers["If-None-Match"] = cache["etag"]
+    if cache.get("last_modified"):
+        headers["If-Modified-Since"] = cache["last_modified"]
     
-    df = pd.json_normalize(products)
-    df.to_csv("extract/data/products.csv", index=False)
+    # stream the body straight to disk; it is parsed once, in transform
+    with SESSION.get(f"https://fakestoreapi.com/{entity}", headers=headers, stream=True, timeout=10) as response:
+        if response.status_code == 304:
+            raise AirflowSkipException(f"{entity} unchanged since the last load")
+        response.raise_for_status()
+        response.raw.decode_content = True
+        with open(raw_file, "wb") as f:
+            shutil.copyfileobj(response.raw, f)
     
-    print("Products extraction completed")
-    return f"Extracted {len(df)} products"
+    # saved to the Variable by load_to_snowflake once this payload is loaded
+    context["ti"].xcom_push(key="http_cache", value={
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    })
+    
+    print(f"{entity.capitalize()} extraction completed")
+    return f"Extracted {entity} ({raw_file.stat().st_size} bytes)"
 
-# fetch_users.py function  
-def extract_users(**context):
-    """Extract users data from FakeStore API"""
-    extract_dir = Path("extract/data")
-    extract_dir.mkdir(parents=True, exist_ok=True)
+def clean_file(json_file, transform_dir):
+    """Clean one raw JSON response into transform_dir and return the cleaned file name"""
+    # imported here so the scheduler does not pay for it when parsing the DAG
+    import polars as pl
     
-    response = requests.get("https://fakestoreapi.com/users")
-    users = response.json()
+    df = pl.read_json(json_file)
+    top_level = [column for column, dtype in df.schema.items() if not isinstance(dtype, pl.Struct)]
     
-    df = pd.json_normalize(users)
-    df.to_csv("extract/data/users.csv", index=False)
+    # flatten nested objects into parent.child columns, like pd.json_normalize
+    while structs := [column for column, dtype in df.schema.items() if isinstance(dtype, pl.Struct)]:
+        df = df.with_columns(
+            pl.col(column).struct.rename_fields([f"{column}.{field.name}" for field in df.schema[column].fields])
+            for column in structs
+        ).unnest(structs)
     
-    print("Users extraction completed")
-    return f"Extracted {len(df)} users"
-
-# fetch_carts.py function
-def extract_carts(**context):
-    """Extract carts data from FakeStore API"""
-    extract_dir = Path("extract/data")
-    extract_dir.mkdir(parents=True, exist_ok=True)
+    # json_normalize order: top-level scalars first, then the flattened objects
+    df = df.select(top_level + [column for column in df.columns if column not in top_level])
+    
+    # keep list fields (e.g. cart products) as JSON text
+    lists = [column for column, dtype in df.schema.items() if isinstance(dtype, pl.List)]
+    if lists:
+        df = df.with_columns(
+            pl.col(column).map_elements(lambda value: json.dumps(value.to_list()), return_dtype=pl.String)
+            for column in lists
+        )
+    
+    # column standardization
+    df = df.rename({
+        column: _CLEAN.sub("", column.strip().lower().replace(" ", "_"))
+        for column in df.columns
+    })
     
-    response = requests.get("https://fakestoreapi.com/carts")
-    carts = response.json()
+    # data cleaning, deduplicating on the natural key when there is one
+    df = df.unique(subset=["id"] if "id" in df.columns else None, keep="first", maintain_order=True)
+    df = df.filter(~pl.all_horizontal(pl.all().is_null()))
     
-    df = pd.json_normalize(carts)
-    df.to_csv("extract/data/carts.csv", index=False)
+    # Save cleaned data gzipped; Snowflake decompresses on load.
+    # mtime=0 keeps the bytes (and so the S3 ETag) stable for unchanged data
+    cleaned_name = json_file.stem + "_clean.csv.gz"
+    with gzip.GzipFile(transform_dir / cleaned_name, "wb", mtime=0) as out:
+        df.write_csv(out)
     
-    print("Carts extraction completed")
-    return f"Extracted {len(df)} carts"
+    return cleaned_name
 
 # transform.ipynb function
-def transform_data(**context):
-    """Transform and clean data using your existing logic"""
-    # Create transform/cleaned directory to match your structure
-    cleaned_dir = Path("transform/cleaned")
-    cleaned_dir.mkdir(parents=True, exist_ok=True)
+def transform_entity(entity, **context):
+    """Transform and clean one entity using your existing logic"""
+    json_file = EXTRACT_DIR / f"{entity}.json"
+    cleaned_name = clean_file(json_file, CLEANED_DIR)
     
-    # existing path logic from transform.ipynb
-    base_dir = Path().resolve()
-    raw_dir = base_dir / "extract" / "data"
-    transform_dir = base_dir / "transform" / "cleaned"
+    # COPY INTO maps columns by position, so the cleaned header must line up with SNOWFLAKE_COLUMNS
+    with gzip.open(CLEANED_DIR / cleaned_name, "rt") as f:
+        header = f.readline().strip().replace('"', '').split(",")
+    expected = [column.strip().replace("_", "") for column in SNOWFLAKE_COLUMNS[entity].split(",")]
+    if [column.replace("_", "") for column in header[:len(expected)]] != expected:
+        raise ValueError(f"{cleaned_name} columns {header} do not match {entity}_table load order")
     
-    processed_files = []
-    
-    for csv_file in raw_dir.glob("*.csv"):
-        df = pd.read_csv(csv_file)
-        
-        # column standardization
-        df.columns = (
-            df.columns.str.strip()
-            .str.lower()
-            .str.replace(" ", "_")
-            .str.replace(r"[^\w_]", "", regex=True)
+    print(f"Processed {json_file.name} -> {cleaned_name}")
+    return f"Processed {cleaned_name}"
+
+# S3 client shared by every upload in this worker process
+_S3 = None
+
+def get_s3():
+    """Return the process-wide S3 client, creating it on first use"""
+    global _S3
+    if _S3 is None:
+        _S3 = boto3.client(
+            "s3",
+            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+            region_name=os.getenv("AWS_REGION"),
+            config=Config(max_pool_connections=16, retries={"max_attempts": 5, "mode": "adaptive"})
         )
-        
-        # exact data cleaning
-        df = df.drop_duplicates()
-        df = df.dropna(how="all")
-        
-        # Save cleaned data
-        cleaned_name = csv_file.stem + "_clean.csv"
-        df.to_csv(transform_dir / cleaned_name, index=False)
-        processed_files.append(cleaned_name)
-        
-        print(f"Processed {csv_file.name} -> {cleaned_name}")
-    
-    print("Data transformation completed")
-    return f"Processed {len(processed_files)} files: {processed_files}"
+    return _S3
 
 # upload_cleaned.py function
-def upload_to_s3(**context):
-    """Upload cleaned data to S3 using your existing logic"""
-    # Environment variables
-    AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-    AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY") 
-    AWS_REGION = os.getenv("AWS_REGION")
+def upload_entity(entity, **context):
+    """Upload one entity's cleaned data to S3 using your existing logic"""
     S3_BUCKET_NAME = "ecommerce-cleaned-nick-v1"
+    s3 = get_s3()
     
-    # S3 client setup
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_REGION
-    )
+    csv_file = CLEANED_DIR / f"{entity}_clean.csv.gz"
     
-    # upload with correct paths
-    base_dir = Path().resolve()
-    cleaned_dir = base_dir / "transform" / "cleaned"
-    uploaded_files = []
+    try:
+        s3.upload_file(
+            Filename=str(csv_file),
+            Bucket=S3_BUCKET_NAME,
+            Key=f"cleaned/{csv_file.name}",
+            ExtraArgs={"ContentType": "application/gzip"},
+            Config=TRANSFER_CONFIG
+        )
+        print(f"Upload successful: {csv_file.name}")
+    except Exception as e:
+        print(f"Upload failed for {csv_file.name}: {e}")
+        raise
     
-    if cleaned_dir.exists():
-        csv_files = list(cleaned_dir.glob("*.csv"))
-        print(f"Found {len(csv_files)} CSV files to upload")
-        
-        for csv_file in csv_files:
-            s3_key = f"cleaned/{csv_file.name}"
-            
-            try:
-                s3.upload_file(
-                    Filename=str(csv_file),
-                    Bucket=S3_BUCKET_NAME,
-                    Key=s3_key
-                )
-                print(f"Upload successful: {csv_file.name}")
-                uploaded_files.append(csv_file.name)
-            except Exception as e:
-                print(f"Upload failed for {csv_file.name}: {e}")
-                raise
-    
-    print("S3 upload completed")
-    return f"Uploaded {len(uploaded_files)} files: {uploaded_files}"
+    return f"Uploaded {csv_file.name}"
 
 def load_to_snowflake(**context):
-    """Load data to Snowflake using your existing SQL"""
-    import subprocess
-    
-    # Environment variables for Snowflake
-    snowflake_account = os.getenv("SNOWFLAKE_ACCOUNT")
-    snowflake_user = os.getenv("SNOWFLAKE_USER")
-    
-    # Path to SQL script
-    base_dir = Path().resolve()
-    sql_file = base_dir / "sql" / "ddl" / "create_tables.sql"
-    
-    cmd = [
-        "snowsql",
-        "-a", snowflake_account,
-        "-u", snowflake_user,
-        "-d", "ECOMMERCE_DB",
-        "-s", "RAW_DATA", 
-        "-f", str(sql_file)
-    ]
+    """Load the uploaded S3 files into Snowflake with COPY INTO"""
+    import snowflake.connector
+    
+    # one session for all tables; the tables and s3_stage are created once by sql/ddl/create_tables.sql
+    conn = snowflake.connector.connect(
+        account=os.getenv("SNOWFLAKE_ACCOUNT"),
+        user=os.getenv("SNOWFLAKE_USER"),
+        password=os.getenv("SNOWFLAKE_PASSWORD"),
+        warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
+        database=os.getenv("SNOWFLAKE_DATABASE", "ECOMMERCE_DB"),
+        schema=os.getenv("SNOWFLAKE_SCHEMA", "RAW_DATA")
+    )
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        print("Snowflake load completed successfully")
-        return "Data loaded to Snowflake"
-    except subprocess.CalledProcessError as e:
+        cursor = conn.cursor()
+        
+        # every run reloads a full snapshot: files are first copied into session-scoped
+        # staging tables, so the target tables are untouched until all of them have loaded
+        for entity in ENTITIES:
+            cursor.execute(f"""
+                CREATE OR REPLACE TEMPORARY TABLE {entity}_staging AS
+                SELECT {SNOWFLAKE_COLUMNS[entity]} FROM {entity}_table LIMIT 0
+            """)
+        
+        # submit every COPY up front so the warehouse ingests the tables concurrently
+        query_ids = {}
+        for entity in ENTITIES:
+            cursor.execute_async(f"""
+                COPY INTO {entity}_staging
+                FROM @s3_stage
+                FILES = ('{entity}_clean.csv.gz')
+                FILE_FORMAT = csv_format
+                ON_ERROR = ABORT_STATEMENT
+            """)
+            query_ids[entity] = cursor.sfqid
+        
+        try:
+            for entity, query_id in query_ids.items():
+                while conn.is_still_running(conn.get_query_status_throw_if_error(query_id)):
+                    time.sleep(1)
+                print(f"Staged {entity}_clean.csv.gz")
+        except snowflake.connector.errors.Error:
+            # cancel the COPYs still running so nothing keeps loading after the task fails
+            for query_id in query_ids.values():
+                if conn.is_still_running(conn.get_query_status(query_id)):
+                    cursor.execute(f"SELECT SYSTEM$CANCEL_QUERY('{query_id}')")
+            raise
+        
+        # replace the contents of all three tables in one transaction
+        cursor.execute("BEGIN")
+        for entity in ENTITIES:
+            cursor.execute(f"DELETE FROM {entity}_table")
+            cursor.execute(f"""
+                INSERT INTO {entity}_table ({SNOWFLAKE_COLUMNS[entity]})
+                SELECT {SNOWFLAKE_COLUMNS[entity]} FROM {entity}_staging
+            """)
+            print(f"Loaded {entity}_clean.csv.gz into {entity}_table")
+        cursor.execute("COMMIT")
+    except snowflake.connector.errors.Error as e:
+        conn.rollback()
         print(f"Snowflake load failed: {e}")
         raise
+    finally:
+        conn.close()
+    
+    # remember what was loaded so unchanged endpoints are skipped next run
+    for entity in ENTITIES:
+        cache = context["ti"].xcom_pull(task_ids=f"extract_{entity}", key="http_cache")
+        if cache:
+            Variable.set(HTTP_CACHE_VARIABLE.format(entity=entity), cache, serialize_json=True)
+    
+    print("Snowflake load completed successfully")
+    return "Data loaded to Snowflake"
 
 # Define tasks
 start_pipeline = DummyOperator(
@@ -200,39 +305,10 @@ start_pipeline = DummyOperator(
     dag=dag
 )
 
-extract_products_task = PythonOperator(
-    task_id='extract_products',
-    python_callable=extract_products,
-    dag=dag
-)
-
-extract_users_task = PythonOperator(
-    task_id='extract_users',
-    python_callable=extract_users,
-    dag=dag
-)
-
-extract_carts_task = PythonOperator(
-    task_id='extract_carts',
-    python_callable=extract_carts,
-    dag=dag
-)
-
-transform_data_task = PythonOperator(
-    task_id='transform_data',
-    python_callable=transform_data,
-    dag=dag
-)
-
-upload_s3_task = PythonOperator(
-    task_id='upload_to_s3',
-    python_callable=upload_to_s3,
-    dag=dag
-)
-
 load_snowflake_task = PythonOperator(
     task_id='load_to_snowflake',
     python_callable=load_to_snowflake,
+    trigger_rule=TriggerRule.NONE_FAILED_MIN_ONE_SUCCESS,
     dag=dag
 )
 
@@ -241,5 +317,35 @@ end_pipeline = DummyOperator(
     dag=dag
 )
 
+# One branch per entity, so each entity moves on as soon as its own upstream is done
+upload_tasks = []
+
+for entity in ENTITIES:
+    extract_task = PythonOperator(
+        task_id=f'extract_{entity}',
+        python_callable=extract_entity,
+        op_kwargs={'entity': entity},
+        pool=NETWORK_IO_POOL,
+        dag=dag
+    )
+    
+    transform_task = PythonOperator(
+        task_id=f'transform_{entity}',
+        python_callable=transform_entity,
+        op_kwargs={'entity': entity},
+        dag=dag
+    )
+    
+    upload_task = PythonOperator(
+        task_id=f'upload_{entity}',
+        python_callable=upload_entity,
+        op_kwargs={'entity': entity},
+        pool=NETWORK_IO_POOL,
+        dag=dag
+    )
+    
+    start_pipeline >> extract_task >> transform_task >> upload_task
+    upload_tasks.append(upload_task)
+
 # Set task dependencies
-start_pipeline >> [extract_products_task, extract_users_task, extract_carts_task] >> transform_data_task >> upload_s3_task >> load_snowflake_task >> end_pipeline
\ No newline at end of file
+upload_tasks >> load_snowflake_task >> end_pipeline
\ No newline at end of file
@@ -1,13 +1,19 @@
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pcsv
 import requests
 import os
 
 os.makedirs("data", exist_ok=True)
 
 response = requests.get("https://fakestoreapi.com/carts")
-products = response.json()
+products = orjson.loads(response.content)
 
-df = pd.json_normalize(products)
-df = df.to_csv("data/carts.csv", index = False)
+# carts are flat records (the products list stays as one column)
+df = pd.DataFrame(products)
+# the CSV writer cannot serialize nested lists, so store them as JSON text
+df["products"] = df["products"].map(lambda items: orjson.dumps(items).decode())
+pcsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), "data/carts.csv")
 
 print("nigga it works")
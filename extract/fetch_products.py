@@ -1,13 +1,17 @@
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pcsv
 import requests
 import os
 
 os.makedirs("data", exist_ok=True)
 
 response = requests.get("https://fakestoreapi.com/products")
-products = response.json()
+products = orjson.loads(response.content)
 
+# products have nested objects, so they still need flattening
 df = pd.json_normalize(products)
-df = df.to_csv("data/products.csv", index = False)
+pcsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), "data/products.csv")
 
 print("nigga it works")
\ No newline at end of file
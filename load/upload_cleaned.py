@@ -1,6 +1,8 @@
 from pathlib import Path
 import boto3
 import os
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,7 +18,8 @@ s3 = boto3.client(
     "s3",
     aws_access_key_id=AWS_ACCESS_KEY_ID,
     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION
+    region_name=AWS_REGION,
+    config=Config(max_pool_connections=16, retries={"max_attempts": 5, "mode": "adaptive"})
 )
 
 # Upload files
@@ -27,20 +30,27 @@ print(f"Looking for CSV files in: {cleaned_dir}")
 print(f"Directory exists: {cleaned_dir.exists()}")
 
 if cleaned_dir.exists():
-    csv_files = list(cleaned_dir.glob("*.csv"))
+    csv_files = [Path(entry.path) for entry in os.scandir(cleaned_dir) if entry.name.endswith(".csv") and entry.is_file()]
     print(f"Found {len(csv_files)} CSV files: {[f.name for f in csv_files]}")
     
-    for csv_file in csv_files:
-        s3_key = f"cleaned/{csv_file.name}"
-        
-        try:
-            s3.upload_file(
+    # Upload concurrently - each PUT is network-bound
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = {
+            pool.submit(
+                s3.upload_file,
                 Filename=str(csv_file),
                 Bucket=S3_BUCKET_NAME,
-                Key=s3_key
-            )
-            print(f"Upload successful: {csv_file.name}")
-        except Exception as e:
-            print(f"Upload failed for {csv_file.name}: {e}")
+                Key=f"cleaned/{csv_file.name}"
+            ): csv_file
+            for csv_file in csv_files
+        }
+        
+        for future in as_completed(futures):
+            csv_file = futures[future]
+            try:
+                future.result()
+                print(f"Upload successful: {csv_file.name}")
+            except Exception as e:
+                print(f"Upload failed for {csv_file.name}: {e}")
 else:
     print("Directory 'transform/cleaned' not found!")
\ No newline at end of file
@@ -1,5 +1,6 @@
 -- E-commerce Data Pipeline - Snowflake Setup
 -- This script sets up the complete Snowflake environment for the FakeStore API data pipeline
+-- Run it once; on each run the Airflow DAG reloads the tables from the S3 stage as a full snapshot
 
 -- Create database and schema
 CREATE DATABASE IF NOT EXISTS ECOMMERCE_DB;
@@ -9,7 +10,7 @@ USE ECOMMERCE_DB.RAW_DATA;
 -- TABLE CREATION
 
 -- Products table - stores product catalog information
-CREATE OR REPLACE TABLE products_table (
+CREATE TABLE IF NOT EXISTS products_table (
     id INTEGER PRIMARY KEY,
     title VARCHAR(500) NOT NULL,
     price DECIMAL(10,2) NOT NULL,
@@ -23,7 +24,7 @@ CREATE OR REPLACE TABLE products_table (
 );
 
 -- Users table - stores customer information
-CREATE OR REPLACE TABLE users_table (
+CREATE TABLE IF NOT EXISTS users_table (
     id INTEGER PRIMARY KEY,
     email VARCHAR(100) UNIQUE NOT NULL,
     username VARCHAR(50) UNIQUE NOT NULL,
@@ -43,7 +44,7 @@ CREATE OR REPLACE TABLE users_table (
 );
 
 -- Carts table - stores shopping cart and order information
-CREATE OR REPLACE TABLE carts_table (
+CREATE TABLE IF NOT EXISTS carts_table (
     id INTEGER PRIMARY KEY,
     userid INTEGER NOT NULL,
     date TIMESTAMP NOT NULL,